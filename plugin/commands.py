@@ -1,36 +1,91 @@
-from .patcher import AlreadyPatchedException
-from .patcher import json_dumps
-from .patcher import Patcher
-from .patcher import PatcherUnsupportedException
-from .patcher import restore_directory
 from .plugin_message import console_msg
+from .plugin_message import console_msg_raw
 from .plugin_message import error_box
 from .plugin_message import info_box
+from .plugin_message import PACKAGE_NAME
 from .utils import get_command_name
-from lsp_utils import ServerNpmResource
-from types import ModuleType
-from typing import Any, Callable, Dict, List, Tuple, cast
+from types import MappingProxyType, ModuleType
+from typing import Any, Callable, Dict, Mapping, Tuple, TYPE_CHECKING
+import functools
 import importlib
 import os
+import stat
 import sublime
 import sublime_plugin
+import sys
+import time
+
+if TYPE_CHECKING:
+    from lsp_utils import ServerNpmResource
+
+
+LSP_PLUGIN_MODULE_NAME = "LSP-intelephense.plugin"
+
+EMPTY_COMMAND_ARGS = MappingProxyType({})  # type: Mapping[str, Any]
+
+# seconds; a positively verified server binary is re-stat'ed at most this often
+SERVER_VERIFY_INTERVAL = 10
+
+# cache entries are {"resource": ..., "binary_dir": ..., "verified_at": ...}
+server_resource_cache = {}  # type: Dict[Tuple[str, str], Dict[str, Any]]
+
+# remembers that the LSP-intelephense import already failed once
+lsp_plugin_import_failed = False
+
+
+restart_scheduled = False
 
 
 def restart_intelephense_server() -> None:
+    # debounced so several restart requests within one event-loop tick
+    # (e.g., during a re-patch) collapse into a single actual restart
+    global restart_scheduled
+
+    if restart_scheduled:
+        return
+
+    restart_scheduled = True
+    sublime.set_timeout(do_restart_intelephense_server, 0)
+
+
+def do_restart_intelephense_server() -> None:
+    global restart_scheduled
+
+    restart_scheduled = False
+
     view = sublime.active_window().active_view()
     if view:
         view.run_command("lsp_restart_server", {"config_name": "LSP-intelephense"})
 
 
-def st_command_run_precheck(func: Callable) -> Callable:
-    def wrap(self: sublime_plugin.Command, *args, **kwargs) -> None:
-        def checker() -> Tuple[ModuleType, ServerNpmResource]:
-            try:
-                plugin_module = importlib.import_module("LSP-intelephense.plugin")
-                lsp_plugin = plugin_module.LspIntelephensePlugin  # type: ignore
-            except (ImportError, AttributeError):
-                raise RuntimeError("LSP-intelephense is not installed...")
-
+def resolve_server_resource() -> Tuple[ModuleType, "ServerNpmResource"]:
+    # deferred so importing this module on ST startup stays cheap
+    from lsp_utils import ServerNpmResource
+
+    global lsp_plugin_import_failed
+
+    try:
+        # peek the import cache first so hot invocations skip the import lock
+        plugin_module = sys.modules.get(LSP_PLUGIN_MODULE_NAME)
+        if plugin_module is None:
+            # don't re-walk the import finders after a known failure; once the
+            # package gets installed, ST imports it and it appears in sys.modules
+            if lsp_plugin_import_failed:
+                raise ImportError(LSP_PLUGIN_MODULE_NAME)
+            plugin_module = importlib.import_module(LSP_PLUGIN_MODULE_NAME)
+        lsp_plugin_import_failed = False
+        lsp_plugin = plugin_module.LspIntelephensePlugin  # type: ignore
+        cache_key = (lsp_plugin.package_name, lsp_plugin.package_storage())
+    except ImportError:
+        lsp_plugin_import_failed = True
+        raise RuntimeError("LSP-intelephense is not installed...")
+    except AttributeError:
+        raise RuntimeError("LSP-intelephense is not installed...")
+
+    entry = server_resource_cache.get(cache_key)
+
+    if entry is None:
+        try:
             server_resource = ServerNpmResource.create(
                 {
                     "package_name": lsp_plugin.package_name,
@@ -41,20 +96,48 @@ def st_command_run_precheck(func: Callable) -> Callable:
                     "storage_path": lsp_plugin.storage_path(),
                 }
             )
+        except AttributeError:
+            raise RuntimeError("LSP-intelephense is not installed...")
+
+        if not server_resource:
+            raise RuntimeError("LSP-intelephense does not seem to be usable...")
+
+        entry = {
+            "resource": server_resource,
+            "binary_dir": os.path.dirname(server_resource.binary_path),
+            "verified_at": None,
+        }
+        server_resource_cache[cache_key] = entry
+
+        # let call sites reuse the dirname without rescanning the path
+        server_resource._binary_dir = entry["binary_dir"]
+
+    server_resource = entry["resource"]
+
+    now = time.monotonic()
+    if entry["verified_at"] is None or now - entry["verified_at"] >= SERVER_VERIFY_INTERVAL:
+        try:
+            is_binary_file = stat.S_ISREG(os.stat(server_resource.binary_path).st_mode)
+        except OSError:
+            is_binary_file = False
+
+        if not is_binary_file:
+            raise RuntimeError(
+                "The intelephense server has not been installed yet... "
+                + "Open a PHP project to install it and then retry."
+            )
 
-            if not server_resource:
-                raise RuntimeError("LSP-intelephense does not seem to be usable...")
+        # only successful checks are remembered so a just-installed server is seen right away
+        entry["verified_at"] = now
 
-            if not os.path.isfile(server_resource.binary_path):
-                raise RuntimeError(
-                    "The intelephense server has not been installed yet... "
-                    + "Open a PHP project to install it and then retry."
-                )
+    return (plugin_module, server_resource)
 
-            return (plugin_module, server_resource)
 
+def st_command_run_precheck(func: Callable) -> Callable:
+    @functools.wraps(func)
+    def wrap(self: sublime_plugin.Command, *args, **kwargs) -> None:
         try:
-            _, server_resource = checker()
+            _, server_resource = resolve_server_resource()
         except Exception as e:
             return error_box("[{_}] {}", e)
 
@@ -67,17 +150,19 @@ class PatcherLspIntelephensePatchCommand(sublime_plugin.ApplicationCommand):
     @st_command_run_precheck
     def run(
         self,
-        server_resource: ServerNpmResource,
+        server_resource: "ServerNpmResource",
         allow_unsupported: bool = False,
         is_direct: bool = True,
     ) -> None:
+        from .patcher import AlreadyPatchedException, Patcher, PatcherUnsupportedException, json_dumps
+
         binary_path = server_resource.binary_path
 
         is_already_patched = False
         is_success = False
 
         try:
-            is_success, occurrences = Patcher.patch_file(binary_path, allow_unsupported)
+            is_success, occurrences, patch_info = Patcher.patch_file(binary_path, allow_unsupported)
 
             if is_success and occurrences > 0:
                 info_box('[{_}] "{}" is patched with {} occurrences!', binary_path, occurrences)
@@ -93,9 +178,10 @@ class PatcherLspIntelephensePatchCommand(sublime_plugin.ApplicationCommand):
         if not is_success:
             return
 
-        patch_info = Patcher.extract_patch_info(binary_path)
-
         if is_already_patched:
+            # the file was not rewritten, so read the info it was patched with
+            patch_info = Patcher.extract_patch_info(binary_path)
+
             msg = '[{_}] "{bin}" had been already patched...'
 
             if Patcher.VERSION > patch_info["version"]:
@@ -113,20 +199,28 @@ class PatcherLspIntelephenseUnpatchCommand(sublime_plugin.ApplicationCommand):
     @st_command_run_precheck
     def run(
         self,
-        server_resource: ServerNpmResource,
+        server_resource: "ServerNpmResource",
         is_direct: bool = True,
     ) -> None:
-        binary_path = server_resource.binary_path
+        from .patcher import restore_directory
 
-        restored_files = restore_directory(os.path.dirname(binary_path))
+        restored_files = restore_directory(server_resource._binary_dir)
 
         if not restored_files:
             return error_box("[{_}] No file has been restored...")
 
         restored_files_len = len(restored_files)
 
-        for idx, file in enumerate(restored_files):
-            console_msg("[{_}] {}/{} file restored: {}", idx + 1, restored_files_len, file)
+        # batch into a single console write rather than one per restored file;
+        # the "[PKG]" tag is resolved once instead of via the template pass per line
+        tag = "[{}]".format(PACKAGE_NAME)
+
+        console_msg_raw(
+            "\n".join(
+                "{} {}/{} file restored: {}".format(tag, idx + 1, restored_files_len, file)
+                for idx, file in enumerate(restored_files)
+            )
+        )
 
         if is_direct:
             restart_intelephense_server()
@@ -136,39 +230,56 @@ class PatcherLspIntelephenseUnpatchCommand(sublime_plugin.ApplicationCommand):
 
 class PatcherLspIntelephenseRepatchCommand(sublime_plugin.ApplicationCommand):
     @st_command_run_precheck
-    def run(self, server_resource: ServerNpmResource) -> None:
-        sublime.run_command(get_command_name(PatcherLspIntelephenseUnpatchCommand), {"is_direct": False})
-        sublime.run_command(get_command_name(PatcherLspIntelephensePatchCommand), {"is_direct": False})
+    def run(self, server_resource: "ServerNpmResource") -> None:
+        # the precheck has already run for this invocation; call the undecorated
+        # run() bodies directly rather than re-entering the command dispatcher
+        PatcherLspIntelephenseUnpatchCommand.run.__wrapped__(self, server_resource, is_direct=False)
+        PatcherLspIntelephensePatchCommand.run.__wrapped__(self, server_resource, is_direct=False)
         restart_intelephense_server()
 
 
 class PatcherLspIntelephenseOpenServerBinaryDirCommand(sublime_plugin.WindowCommand):
     @st_command_run_precheck
-    def run(self, server_resource: ServerNpmResource) -> None:
-        self.window.run_command("open_dir", {"dir": os.path.dirname(server_resource.binary_path)})
+    def run(self, server_resource: "ServerNpmResource") -> None:
+        self.window.run_command("open_dir", {"dir": server_resource._binary_dir})
 
 
 class PatcherLspIntelephenseShowMenuCommand(sublime_plugin.WindowCommand):
-    menu_items = [
-        # title, cmd_class, cmd_arg
-        ("Patch Intelephense", PatcherLspIntelephensePatchCommand, {}),
-        ("Patch Intelephense (Allow Unsupported)", PatcherLspIntelephensePatchCommand, {"allow_unsupported": True}),
-        ("Un-patch Intelephense", PatcherLspIntelephenseUnpatchCommand, {}),
-        ("Re-patch Intelephense", PatcherLspIntelephenseRepatchCommand, {}),
-        ("Open Server Binary Directory", PatcherLspIntelephenseOpenServerBinaryDirCommand, {}),
-    ]  # type: List[Tuple[str, type, Dict[str, Any]]]
-
-    def run(self) -> None:
-        titles, cmd_classes, cmd_args = cast(
-            # make stupid type deduction tool happy
-            Tuple[Tuple[str, ...], Tuple[type, ...], Tuple[Dict[str, Any], ...]],
-            zip(*self.menu_items),
+    # parallel rows, transposed once here rather than on every menu open
+    menu_titles = (
+        "Patch Intelephense",
+        "Patch Intelephense (Allow Unsupported)",
+        "Un-patch Intelephense",
+        "Re-patch Intelephense",
+        "Open Server Binary Directory",
+    )  # type: Tuple[str, ...]
+
+    menu_cmd_names = tuple(
+        get_command_name(cmd_class)
+        for cmd_class in (
+            PatcherLspIntelephensePatchCommand,
+            PatcherLspIntelephensePatchCommand,
+            PatcherLspIntelephenseUnpatchCommand,
+            PatcherLspIntelephenseRepatchCommand,
+            PatcherLspIntelephenseOpenServerBinaryDirCommand,
         )
+    )  # type: Tuple[str, ...]
 
-        def on_select(idx: int) -> None:
-            if idx < 0:
-                return
+    # frozen so sharing the empty-args singleton across rows is safe
+    menu_cmd_args = (
+        EMPTY_COMMAND_ARGS,
+        MappingProxyType({"allow_unsupported": True}),
+        EMPTY_COMMAND_ARGS,
+        EMPTY_COMMAND_ARGS,
+        EMPTY_COMMAND_ARGS,
+    )  # type: Tuple[Mapping[str, Any], ...]
 
-            self.window.run_command(get_command_name(cmd_classes[idx]), cmd_args[idx])
+    def run(self) -> None:
+        self.window.show_quick_panel(self.menu_titles, on_select=self.on_select)
+
+    def on_select(self, idx: int) -> None:
+        if idx < 0:
+            return
 
-        self.window.show_quick_panel(titles, on_select=on_select)
+        # the ST API wants a real dict, so unfreeze at dispatch time
+        self.window.run_command(self.menu_cmd_names[idx], dict(self.menu_cmd_args[idx]))
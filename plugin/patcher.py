@@ -186,24 +186,24 @@ class Patcher:
     }
 
     @classmethod
-    def patch_file(cls, path: str, allow_unsupported: bool = False) -> Tuple[bool, int]:
+    def patch_file(cls, path: str, allow_unsupported: bool = False) -> Tuple[bool, int, Dict[str, Any]]:
         if not path or not os.path.isfile(path):
-            return (False, 0)
+            return (False, 0, {})
 
         backup_files([path])
 
         content = file_get_content(path) or ""
-        content, occurrences = cls.patch_str(content, allow_unsupported)
+        content, occurrences, patch_info = cls.patch_str(content, allow_unsupported)
 
         if occurrences == 0:
-            return (False, 0)
+            return (False, 0, {})
 
         is_success = file_set_content(path, content)
 
-        return (is_success, occurrences)
+        return (is_success, occurrences, patch_info)
 
     @classmethod
-    def patch_str(cls, content: str, allow_unsupported: bool = False) -> Tuple[str, int]:
+    def patch_str(cls, content: str, allow_unsupported: bool = False) -> Tuple[str, int, Dict[str, Any]]:
         if content.rfind(cls.PATCHED_MARK_DETECTION) > -1:
             raise AlreadyPatchedException()
 
@@ -216,9 +216,12 @@ class Patcher:
             content, occurrence = re.subn(ptn.search, ptn.replace, content, max(0, ptn.count), ptn.flags)
             occurrences += occurrence
 
+        patch_info = cls.generate_patch_info(occurrences)
+
         return (
-            content.rstrip() + "\n\n" + cls.generate_patch_marker(occurrences) + "\n",
+            content.rstrip() + "\n\n" + cls.generate_patch_marker(patch_info) + "\n",
             occurrences,
+            patch_info,
         )
 
     @classmethod
@@ -254,17 +257,17 @@ class Patcher:
         ]
 
     @classmethod
-    def generate_patch_marker(cls, occurrences: int = 0) -> str:
-        return cls.PATCHED_MARK.format(
-            info=json_dumps(
-                {
-                    "patcher": __file__,
-                    "version": str(cls.VERSION),
-                    "occurrences": occurrences,
-                    "time": now_isoformat(),
-                },
-            ),
-        )
+    def generate_patch_info(cls, occurrences: int = 0) -> Dict[str, Any]:
+        return {
+            "patcher": __file__,
+            "version": str(cls.VERSION),
+            "occurrences": occurrences,
+            "time": now_isoformat(),
+        }
+
+    @classmethod
+    def generate_patch_marker(cls, patch_info: Dict[str, Any]) -> str:
+        return cls.PATCHED_MARK.format(info=json_dumps(patch_info))
 
     @classmethod
     def extract_patch_info(cls, path_or_content: str) -> Dict[str, Any]:
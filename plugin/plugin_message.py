@@ -1,16 +1,22 @@
 import sublime
 
 
-def pluginfy_msg(msg: str, *args, **kwargs) -> str:
-    package_name = __package__.split(".")[0]
+PACKAGE_NAME = __package__.split(".")[0]
+
 
-    return msg.format(*args, _=package_name, **kwargs)
+def pluginfy_msg(msg: str, *args, **kwargs) -> str:
+    return msg.format(*args, _=PACKAGE_NAME, **kwargs)
 
 
 def console_msg(msg: str, *args, **kwargs) -> None:
     print(pluginfy_msg(msg, *args, **kwargs))
 
 
+def console_msg_raw(msg: str) -> None:
+    # for already-formatted messages; skips the template pass entirely
+    print(msg)
+
+
 def status_msg(msg: str, *args, **kwargs) -> None:
     sublime.status_message(pluginfy_msg(msg, *args, **kwargs))
 
@@ -1,4 +1,5 @@
 from typing import Iterable, Iterator, TypeVar, Union
+import functools
 import re
 
 
@@ -17,6 +18,7 @@ def unique(it: Iterable[T], stable: bool = False) -> Iterator[T]:
     return (OrderedDict.fromkeys(it).keys() if stable else set(it)).__iter__()
 
 
+@functools.lru_cache(maxsize=None)
 def get_command_name(var: Union[type, str]) -> str:
     name = var.__name__ if isinstance(var, type) else str(var)
 